@@ -1,30 +1,37 @@
 import os
+import time
 
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, BaseMessage, RemoveMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
 from langgraph.graph import START, END, MessagesState, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 
-from typing import Any, Literal
+from typing import Any, Literal, Optional
 
 from pydantic import BaseModel, Field
 
 from langchain_google_vertexai import VertexAIEmbeddings
 
+from src.checkpointer import BoundedMemorySaver
+from src.llm_client.client import ResilientChatModel, ResilientEmbeddings, get_guard
 from src.document_processors.pdf_processor import PDFProcessor
 from src.document_processors.javacript_code_processor import JSCodeDocumentProcessor
 from src.vector_store.chromadb import ChromaDB
 from src.vector_store.vertexai_vector_search import VertexAIVectorStore
-from src.tools.javascript_executor.tool import JSCodeExecutor
+from src.vector_store.index_artifact import ArtifactVectorStore, config_hash, index_config
+from src.vector_store.filters import SearchFilter, annotate_documents
+from src.vector_store.selection import retrieve
+from src.tools.javascript_executor.execution import JSExecutionLayer
 from src.prompts import (
     generate_js_code_prompt,
     generate_reply_prompt,
     grade_relevance_prompt_template,
     improve_question_prompt,
+    summarize_conversation_prompt,
     translate_to_korean_prompt,
 )
 
@@ -38,44 +45,114 @@ INDEX_ENDPOINT_ID = os.environ.get("INDEX_ENDPOINT_ID")
 AGENT_MODE = os.environ.get("AGENT_MODE")
 MEMORY_ENABLED = os.environ.get("MEMORY_ENABLED").lower() == "true"
 CHROMADB_PERSIST_DIRECTORY = os.environ.get("CHROMADB_PERSIST_DIRECTORY", "./chroma_lanngchain_db")
-
-embeddings_model = VertexAIEmbeddings(model="text-embedding-005")
-llm = init_chat_model(
-    "gemini-2.0-flash-001",
-    model_provider="google_vertexai",
+INDEX_ARTIFACT_DIRECTORY = os.environ.get("INDEX_ARTIFACT_DIRECTORY")
+INDEX_ARTIFACT_REFRESH_INTERVAL = float(os.environ.get("INDEX_ARTIFACT_REFRESH_INTERVAL", 30))
+LLM_REQUESTS_PER_SECOND = float(os.environ.get("LLM_REQUESTS_PER_SECOND", 10))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+EMBEDDINGS_REQUESTS_PER_SECOND = float(os.environ.get("EMBEDDINGS_REQUESTS_PER_SECOND", 10))
+EMBEDDINGS_MAX_CONCURRENCY = int(os.environ.get("EMBEDDINGS_MAX_CONCURRENCY", 16))
+MODEL_MAX_ATTEMPTS = int(os.environ.get("MODEL_MAX_ATTEMPTS", 5))
+# Number of recent turns sent verbatim when memory is enabled, older turns are summarized
+CONVERSATION_WINDOW = int(os.environ.get("CONVERSATION_WINDOW", 3))
+# Number of conversations kept in memory, the least recently active ones are evicted
+MAX_CONVERSATIONS = int(os.environ.get("MAX_CONVERSATIONS", 1000))
+# Adaptive retrieval depth is opt-in, as it is not yet tuned for the embedding model
+ADAPTIVE_RETRIEVAL = os.environ.get("ADAPTIVE_RETRIEVAL", "false").lower() == "true"
+RETRIEVAL_MIN_K = int(os.environ.get("RETRIEVAL_MIN_K", 4))
+RETRIEVAL_MAX_K = int(os.environ.get("RETRIEVAL_MAX_K", 20))
+JS_EXECUTION_CACHE_SIZE = int(os.environ.get("JS_EXECUTION_CACHE_SIZE", 256))
+JS_MAX_OUTPUT_CHARS = int(os.environ.get("JS_MAX_OUTPUT_CHARS", 10000))
+
+EMBEDDINGS_MODEL_NAME = "text-embedding-005"
+LLM_MODEL_NAME = "gemini-2.0-flash-001"
+
+# Calls to the models share a per-model guard which rate limits, adapts the
+# concurrency, retries transient errors and fails fast when the backend is down.
+# The models' own retries are disabled so that the guard is the only retry layer.
+embeddings_model = ResilientEmbeddings(
+    VertexAIEmbeddings(model=EMBEDDINGS_MODEL_NAME, max_retries=0),
+    get_guard(
+        EMBEDDINGS_MODEL_NAME,
+        requests_per_second=EMBEDDINGS_REQUESTS_PER_SECOND,
+        burst=max(1, int(EMBEDDINGS_REQUESTS_PER_SECOND)),
+        max_concurrency=EMBEDDINGS_MAX_CONCURRENCY,
+        max_attempts=MODEL_MAX_ATTEMPTS,
+    ),
 )
-
-vector_store = VertexAIVectorStore(
-    project_id=PROJECT_ID,
-    region=REGION,
-    bucket_uri=BUCKET_URI,
-    index_id=INDEX_ID,
-    index_endpoint_id=INDEX_ENDPOINT_ID,
-    embeddings=embeddings_model,
-) if PY_ENV == "prod" else ChromaDB(
-    embeddings=embeddings_model,
-    persist_directory=CHROMADB_PERSIST_DIRECTORY,
-    collection_name="js_code_collection",
+llm = ResilientChatModel(
+    init_chat_model(
+        LLM_MODEL_NAME,
+        model_provider="google_vertexai",
+        max_retries=0,
+    ),
+    get_guard(
+        LLM_MODEL_NAME,
+        requests_per_second=LLM_REQUESTS_PER_SECOND,
+        burst=max(1, int(LLM_REQUESTS_PER_SECOND)),
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_attempts=MODEL_MAX_ATTEMPTS,
+    ),
 )
 
 document_processor = PDFProcessor(embeddings_model) if AGENT_MODE == "text" else JSCodeDocumentProcessor()
 
+js_execution_layer = JSExecutionLayer(
+    cache_size=JS_EXECUTION_CACHE_SIZE,
+    max_output_chars=JS_MAX_OUTPUT_CHARS,
+)
+
+# When an artifact directory is set, serve the promoted read-only index artifact
+# (see src/vector_store/index_artifact.py) instead of a mutable vector store
+if INDEX_ARTIFACT_DIRECTORY:
+    vector_store = ArtifactVectorStore(
+        embeddings=embeddings_model,
+        root=INDEX_ARTIFACT_DIRECTORY,
+        expected_config_hash=config_hash(index_config(EMBEDDINGS_MODEL_NAME, document_processor.config)),
+        refresh_interval=INDEX_ARTIFACT_REFRESH_INTERVAL,
+    )
+elif PY_ENV == "prod":
+    vector_store = VertexAIVectorStore(
+        project_id=PROJECT_ID,
+        region=REGION,
+        bucket_uri=BUCKET_URI,
+        index_id=INDEX_ID,
+        index_endpoint_id=INDEX_ENDPOINT_ID,
+        embeddings=embeddings_model,
+    )
+else:
+    vector_store = ChromaDB(
+        embeddings=embeddings_model,
+        persist_directory=CHROMADB_PERSIST_DIRECTORY,
+        collection_name="js_code_collection",
+    )
+
 RECURSION_LIMIT = 5
 
-@tool(response_format="content_and_artifact")
-def retriever(query: str):
-    """Retrieves context related to the given query"""
+class AgentState(MessagesState):
+    """Graph state with the bounded conversation memory."""
 
-    retrieved_docs = vector_store.search(query, k=20)
-    serialized = "\n\n".join(
-        (f"Source: {doc.metadata}\n" f"Content: {doc.page_content}")
-        for doc in retrieved_docs
-    )
+    # Running summary of the turns which no longer fit in the conversation window
+    summary: str
+    # Context retrieved for the latest answered question
+    context: str
+    # Search filter `context` was retrieved with, see `_filter_key`
+    context_filter: Optional[dict]
 
-    return serialized, retrieved_docs
+def _question(state: AgentState) -> str:
+    """Returns the question of the current turn."""
 
-def grade_documents(state: MessagesState) -> Literal["generate", "rewrite"]:
-    """Determines whether the retrieved documents are relevant to the question."""
+    return next(m.content for m in reversed(state["messages"]) if m.type == "human")
+
+def _filter_key(config: RunnableConfig) -> Optional[dict]:
+    """Returns the search filter of the run in a form kept in and compared across turns."""
+
+    search_filter = config.get("configurable", {}).get("search_filter")
+    if search_filter is None or search_filter.is_empty():
+        return None
+    return search_filter.model_dump()
+
+def _is_relevant(question: str, context: str) -> bool:
+    """Grades whether the context is relevant to the question."""
 
     # Data model
     class Grade(BaseModel):
@@ -88,17 +165,58 @@ def grade_documents(state: MessagesState) -> Literal["generate", "rewrite"]:
 
     grading_prompt = grade_relevance_prompt_template()
     grade = (grading_prompt | llm_with_structured_output).invoke({
-        "question": state["messages"][0].content,
-        "context": state["messages"][-1].content,
+        "question": question,
+        "context": context,
     })
 
-    return "generate"if grade.binary_score == "yes" else "rewrite"
+    return grade.binary_score == "yes"
 
-def translate(state: MessagesState):
+@tool(response_format="content_and_artifact")
+def retriever(query: str, config: RunnableConfig):
+    """Retrieves context related to the given query"""
+
+    # The metadata filter of the request is passed through the run config
+    search_filter = config.get("configurable", {}).get("search_filter")
+    if ADAPTIVE_RETRIEVAL:
+        # The number of documents adapts to how sharply their scores drop off
+        retrieved_docs = retrieve(
+            vector_store,
+            query,
+            min_k=RETRIEVAL_MIN_K,
+            max_k=RETRIEVAL_MAX_K,
+            search_filter=search_filter,
+        )
+    else:
+        retrieved_docs = vector_store.search(query, k=RETRIEVAL_MAX_K, search_filter=search_filter)
+    serialized = "\n\n".join(
+        (f"Source: {doc.metadata}\n" f"Content: {doc.page_content}")
+        for doc in retrieved_docs
+    )
+
+    return serialized, retrieved_docs
+
+def grade_documents(state: AgentState) -> Literal["generate", "rewrite"]:
+    """Determines whether the retrieved documents are relevant to the question."""
+
+    relevant = _is_relevant(_question(state), state["messages"][-1].content)
+    return "generate" if relevant else "rewrite"
+
+def route_question(state: AgentState, config: RunnableConfig) -> Literal["generate", "agent"]:
+    """Skips retrieval for follow-up questions which the previous context still answers."""
+
+    context = state.get("context")
+    # Context retrieved under another filter may hold documents this request excludes
+    if state.get("context_filter") != _filter_key(config):
+        return "agent"
+    if context and _is_relevant(_question(state), context):
+        return "generate"
+    return "agent"
+
+def translate(state: AgentState):
     """Translates user query to the other language."""
 
     msg = translate_to_korean_prompt(
-        query=state["messages"][0].content,
+        query=_question(state),
     )
 
     response = llm.invoke([msg])
@@ -106,16 +224,16 @@ def translate(state: MessagesState):
     # MessagesState appends messages to state instead of overwriting
     return {"messages": [response]}
 
-def agent(state: MessagesState):
+def agent(state: AgentState):
     """Generate tool call for retrieval or respond."""
 
     llm_with_tools = llm.bind_tools([retriever])
-    response = llm_with_tools.invoke(state["messages"][0].content)
+    response = llm_with_tools.invoke(_question(state))
 
     tool_calls =[
         {
             "name": "retriever",
-            "args": {"query": state["messages"][0].content},
+            "args": {"query": _question(state)},
             "id": "tool_call_id_1234abced",
             "type": "tool_call",
         }
@@ -125,9 +243,9 @@ def agent(state: MessagesState):
     # MessagesState appends messages to state instead of overwriting
     return {"messages": [response]}
 
-def generate_text(state: MessagesState):
+def generate_text(state: AgentState):
     msg = generate_reply_prompt(
-        query=state["messages"][0].content,
+        query=_question(state),
         context=state["messages"][-1].content,
     )
 
@@ -136,9 +254,9 @@ def generate_text(state: MessagesState):
     # MessagesState appends messages to state instead of overwriting
     return {"messages": [response]}
 
-def generate_js_code(state: MessagesState):
+def generate_js_code(state: AgentState):
     msg = generate_js_code_prompt(
-        query=state["messages"][0].content,
+        query=_question(state),
         context=state["messages"][-1].content,
     )
 
@@ -147,74 +265,119 @@ def generate_js_code(state: MessagesState):
     # MessagesState appends messages to state instead of overwriting
     return {"messages": [response]}
 
-def rewrite(state: MessagesState):
+def rewrite(state: AgentState):
     """Transform the query to produce a better question."""
 
     msg = improve_question_prompt(
-        query=state["messages"][0].content,
+        query=_question(state),
     )
 
     response = llm.invoke([msg])
     return {"messages": [response]}
 
-# TODO: Include this in the workflow
-def generate_with_conversation(state: MessagesState):
-    """Generate answer."""
-
-    # Get previously generated ToolMessages
-    recent_tool_messages = []
-    for message in reversed(state["messages"]):
-        if message.type == "tool":
-            recent_tool_messages.append(message)
-        else:
-            break
-    tool_messages = recent_tool_messages[::-1]
-
-    prev_tool_context = "\n\n".join(doc.content for doc in tool_messages)
-    msg_with_prev_tool_context = generate_js_code_prompt(
-        query=state["messages"][0].content,
-        context=prev_tool_context,
-    )
+def _split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Splits messages into turns, each one starting with a question."""
 
-    # Get previously generated messages except tool messages
-    conversation_messages = [
-        message
-        for message in state["messages"]
-        if message.type in ("human", "system")
-        or (message.type == "ai" and not message.tool_calls)
-    ]
+    turns = []
+    for message in messages:
+        if message.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
 
-    # Feed llm with the combined messages from memory
-    response = llm.invoke([msg_with_prev_tool_context] + conversation_messages)
+def _summarize(summary: str, turns: list[list[BaseMessage]]) -> str:
+    """Folds the turns into the running summary."""
 
-    return {"messages": [response]}
+    conversation = "\n".join(
+        f"{message.type}: {message.content}"
+        for turn in turns
+        for message in turn
+    )
+    msg = summarize_conversation_prompt(summary=summary or "(empty)", conversation=conversation)
+    return llm.invoke([msg]).content
+
+def conversation_node(generate_prompt):
+    """Creates a generation node which answers with the conversation in mind."""
+
+    def generate_with_conversation(state: AgentState, config: RunnableConfig):
+        """Generate answer."""
+
+        messages = state["messages"]
+        # Context retrieved in this turn, or the previous one when retrieval was skipped
+        context = messages[-1].content if messages[-1].type == "tool" else state.get("context", "")
+
+        *previous_turns, current_turn = _split_turns(messages)
+        recent_turns = previous_turns[-CONVERSATION_WINDOW:] if CONVERSATION_WINDOW > 0 else []
+        dropped_turns = previous_turns[:len(previous_turns) - len(recent_turns)]
+
+        # Turns leaving the window are folded into the summary once, so the
+        # prompt stays bounded however long the conversation runs
+        summary = state.get("summary", "")
+        if dropped_turns:
+            summary = _summarize(summary, dropped_turns)
+
+        history = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] if summary else []
+        for turn in recent_turns:
+            history.extend(
+                message for message in turn
+                if message.type == "human" or (message.type == "ai" and not message.tool_calls)
+            )
+
+        msg = generate_prompt(query=_question(state), context=context)
+        response = llm.invoke(history + [msg])
+
+        # Keep the recent turns and the question only; tool calls, tool
+        # results and rewrites of this turn are replaced by `context`
+        kept = {message.id for turn in recent_turns for message in turn}
+        kept.add(current_turn[0].id)
+        removed = [RemoveMessage(id=message.id) for message in messages if message.id not in kept]
+
+        return {
+            "messages": removed + [response],
+            "summary": summary,
+            "context": context,
+            "context_filter": _filter_key(config),
+        }
+
+    return generate_with_conversation
 
-def execute(state: MessagesState):
+def execute(state: AgentState):
     """Execute generated code."""
 
     code = state["messages"][-1].content
     cleaned_code = code.replace("```javascript", "").replace("```", "").strip()
 
     try:
-        result = JSCodeExecutor.execute(cleaned_code)
-        return {"messages": [result]}
+        result = js_execution_layer.execute(cleaned_code)
+        return {"messages": [AIMessage(content=result)]}
     except Exception as e:
         error_message = f"Error executing code: {str(e)}"
         print(error_message)
-        return {"messages": [HumanMessage(content=error_message)]}
+        return {"messages": [AIMessage(content=error_message)]}
+
+def add_entry_point(workflow: StateGraph):
+    """Adds the entry point, which can skip retrieval in multi-turn conversations."""
+
+    if MEMORY_ENABLED:
+        workflow.add_conditional_edges(START, route_question)
+    else:
+        workflow.add_edge(START, "agent")
 
 def build_js_code_agent():
     """Create langgraph workflow for js code agent."""
 
-    workflow = StateGraph(MessagesState)
+    workflow = StateGraph(AgentState)
     workflow.add_node("agent", agent)
     workflow.add_node("retrieve", ToolNode([retriever]))
     workflow.add_node("rewrite", rewrite)
-    workflow.add_node("generate", generate_js_code)
+    workflow.add_node(
+        "generate",
+        conversation_node(generate_js_code_prompt) if MEMORY_ENABLED else generate_js_code,
+    )
     workflow.add_node("execute", execute)
     workflow.add_node("grade_documents", grade_documents)
 
-    workflow.add_edge(START, "agent")
+    add_entry_point(workflow)
     workflow.add_conditional_edges(
         "agent",
         tools_condition,
@@ -233,16 +396,19 @@ def build_js_code_agent():
 def build_text_agent():
     """Create langgraph workflow for text agent."""
 
-    workflow = StateGraph(MessagesState)
+    workflow = StateGraph(AgentState)
     # workflow.add_node("translate", translate)
     workflow.add_node("agent", agent)
     workflow.add_node("retrieve", ToolNode([retriever]))
     workflow.add_node("rewrite", rewrite)
-    workflow.add_node("generate", generate_text)
+    workflow.add_node(
+        "generate",
+        conversation_node(generate_reply_prompt) if MEMORY_ENABLED else generate_text,
+    )
     workflow.add_node("execute", execute)
     workflow.add_node("grade_documents", grade_documents)
 
-    workflow.add_edge(START, "agent")
+    add_entry_point(workflow)
     # workflow.add_edge("translate", "agent")
     workflow.add_conditional_edges(
         "agent",
@@ -265,7 +431,7 @@ def build_agent():
 
     if MEMORY_ENABLED:
         print("Memory is enabled.")
-        return workflow.compile(checkpointer=MemorySaver())
+        return workflow.compile(checkpointer=BoundedMemorySaver(max_threads=MAX_CONVERSATIONS))
     else:
         print("Memory is disabled.")
         return workflow.compile()
@@ -273,26 +439,41 @@ def build_agent():
 def ask_agent(
     agent: CompiledStateGraph,
     query: str,
-    thread_id: str,
+    thread_id: Optional[str],
     user_id: str,
+    search_filter: Optional[SearchFilter] = None,
+    node_timings: Optional[list[dict[str, Any]]] = None,
 ) -> (dict[str, Any] | Any):
     # TODO: Check whether conversation history is empty,
     # and fetch conversation history if it is so.
 
+    # Node updates are only streamed when the timings are requested (profiling)
     steps = agent.stream(
         {"messages": [{"role": "user", "content": query}]},
-        stream_mode="values",
+        stream_mode="values" if node_timings is None else ["values", "updates"],
         config= {
             "recursion_limit": RECURSION_LIMIT,
-            "configurable": {"thread_id": thread_id},
+            "configurable": {"thread_id": thread_id, "search_filter": search_filter},
         },
     )
 
     res = []
+    last_step_at = time.perf_counter()
     for step in steps:
+        if node_timings is not None:
+            mode, step = step
+            if mode == "updates":
+                # Time since the previous step, including the graph's own overhead
+                now = time.perf_counter()
+                for node in step:
+                    node_timings.append({"node": node, "seconds": now - last_step_at})
+                last_step_at = now
+                continue
+
         step["messages"][-1].pretty_print()
         # Get the last message from the final state
         res = step
+        last_step_at = time.perf_counter()
 
     # res = agent.invoke(
     #     {"messages": [{"role": "user", "content": query}]},
@@ -303,6 +484,17 @@ def ask_agent(
 
     return {"answer": res["messages"][-1].content, "context": []}
 
-async def process_repository(path: str) -> int:
-    docs = await document_processor.process(path)
-    return vector_store.add(docs)
+def metrics() -> dict[str, Any]:
+    return {
+        "js_execution": js_execution_layer.stats.as_dict(),
+        "models": {
+            EMBEDDINGS_MODEL_NAME: get_guard(EMBEDDINGS_MODEL_NAME).stats(),
+            LLM_MODEL_NAME: get_guard(LLM_MODEL_NAME).stats(),
+        },
+    }
+
+def process_repository(path: str, namespace: str) -> int:
+    """Processes and stores the documents. Blocking, run it in a worker thread."""
+
+    docs = document_processor.process(path)
+    return vector_store.add(annotate_documents(docs, namespace, path))
@@ -1,23 +1,40 @@
 import os
 import tempfile
+import uuid
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from typing import Optional
+from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
+from src.profiling import ProfileStore, profile_call, should_profile
 from src.utils import authenticate_vertex_ai
+from src.vector_store.filters import SearchFilter
 
 
 class QuestionRequest(BaseModel):
     query: str
+    # Restricts retrieval to namespaces, path prefix, file extensions or symbol kinds
+    filter: Optional[SearchFilter] = None
+    # Conversation to continue when memory is enabled, a new one is started if omitted
+    thread_id: Optional[str] = None
 
 class AnswerResponse(BaseModel):
     question: str
     answer: str
     source_documents: list
+    # Conversation of the answer, to be sent with follow-up questions;
+    # only set when memory is enabled
+    thread_id: Optional[str] = None
+    # Set when the request was profiled, see GET /profiles/{profile_id}
+    profile_id: Optional[str] = None
 
 class ProcessRepository(BaseModel):
     path: str
+    # Defaults to the name of the repository directory
+    namespace: Optional[str] = None
 
 # Load environment variables from a file(default: .env)
 load_dotenv("/secrets/.env")
@@ -30,43 +47,70 @@ BUCKET_URI = os.environ.get("BUCKET_URI")
 # Define the maximum file size (default: 10 MB)
 MAX_FILE_SIZE = int(os.environ.get("MAX_FILE_SIZE", 10)) * 1024 * 1024
 
+# Fraction of /ask requests to profile, a request can also ask for it
+# with the `X-Profile: true` header
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIRECTORY = os.environ.get("PROFILE_DIRECTORY", "./profiles")
+PROFILE_MAX_COUNT = int(os.environ.get("PROFILE_MAX_COUNT", 50))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+
 authenticate_vertex_ai(PROJECT_ID, LOCATION, CREDENTIALS_FILE, BUCKET_URI)
 
 # Import the agent after authentication
-from src.agentic_rag import ask_agent, build_agent, process_repository
+from src.agentic_rag import MEMORY_ENABLED, ask_agent, build_agent, metrics, process_repository
 
 agent = build_agent()
+profile_store = ProfileStore(PROFILE_DIRECTORY, PROFILE_MAX_COUNT)
 
 app = FastAPI()
 
+# The agent and the document processing call the models synchronously and may
+# sleep while rate limited or backing off, so they must not run on the event
+# loop: sync endpoints are run in the threadpool by FastAPI.
 @app.post("/ask", response_model=AnswerResponse)
-async def ask(request: QuestionRequest):
+def ask(request: QuestionRequest, x_profile: Optional[str] = Header(None)):
     try:
         user_id = "u-abc123"
-        thread_id = "abcd1234"
-
-        result = ask_agent(agent, request.query, thread_id, user_id)
+        # Conversations are only kept, and so only started, when memory is enabled
+        thread_id = (request.thread_id or uuid.uuid4().hex) if MEMORY_ENABLED else None
+
+        profile_id = None
+        if should_profile(x_profile, PROFILE_SAMPLE_RATE):
+            result, profile_id = profile_call(
+                profile_store,
+                lambda node_timings: ask_agent(
+                    agent, request.query, thread_id, user_id, request.filter, node_timings,
+                ),
+                name=f"ask {thread_id}" if thread_id else "ask",
+                interval=PROFILE_INTERVAL_MS / 1000,
+                tags={"query": request.query, "thread_id": thread_id},
+            )
+        else:
+            result = ask_agent(agent, request.query, thread_id, user_id, request.filter)
 
         return AnswerResponse(
             question=request.query,
             answer=result["answer"],
             source_documents=result["context"],
+            thread_id=thread_id,
+            profile_id=profile_id,
         )
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/process-repo")
-async def process_repo(repo: ProcessRepository):
+def process_repo(repo: ProcessRepository):
     try:
-        num_chunks = await process_repository(repo.path)
+        namespace = repo.namespace or Path(repo.path).resolve().name
+        num_chunks = process_repository(repo.path, namespace)
         return {"message": f"Processed {num_chunks} code files"}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/process")
-async def process(file: UploadFile = File(...)):
+async def process(file: UploadFile = File(...), namespace: Optional[str] = Form(None)):
     try:
         # Create a temporary directory
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -87,13 +131,32 @@ async def process(file: UploadFile = File(...)):
                 buffer.write(content)
 
             # Process the saved file
-            num_chunks = await process_repository(str(temp_file_path))
+            # Each upload gets its own namespace unless one is given
+            namespace = namespace or f"upload-{Path(file.filename).stem}"
+            num_chunks = await run_in_threadpool(process_repository, str(temp_file_path), namespace)
             return {"message": f"Processed {num_chunks} chucks of documents"}
 
     except Exception as e:
         print(f"Error processing file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/profiles")
+async def list_profiles():
+    return profile_store.list()
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    path = profile_store.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    # Open the file in https://www.speedscope.app
+    return FileResponse(path, media_type="application/json", filename=f"{profile_id}.speedscope.json")
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics()
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
@@ -0,0 +1,47 @@
+import threading
+
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer which keeps the checkpoints of at most
+    `max_threads` conversations. Writing to a conversation makes it the most
+    recent one, and the least recently written conversations are evicted.
+    Attributes:
+        max_threads (int): Maximum number of conversations kept.
+    """
+    def __init__(self, max_threads: int = 1000, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self._threads: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, config: RunnableConfig, *args: Any, **kwargs: Any) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            result = super().put(config, *args, **kwargs)
+
+            self._threads[thread_id] = None
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                evicted, _ = self._threads.popitem(last=False)
+                self._delete(evicted)
+
+        return result
+
+    def put_writes(self, *args: Any, **kwargs: Any) -> None:
+        with self._lock:
+            super().put_writes(*args, **kwargs)
+
+    def _delete(self, thread_id: str):
+        # Checkpoints are keyed on the thread, pending writes and channel
+        # values on tuples starting with it
+        self.storage.pop(thread_id, None)
+        for store in (self.writes, self.blobs):
+            for key in [key for key in list(store) if key[0] == thread_id]:
+                del store[key]
@@ -5,9 +5,19 @@ from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
 from typing_extensions import List
 
 class JSCodeDocumentProcessor:
+    # Chunking configuration, part of the index config hash
+    config = {
+        "processor": "js_code",
+        "language": Language.JS.value,
+        "chunk_size": 80,
+        "chunk_overlap": 0,
+    }
+
     def __init__(self):
         self.js_splitter = RecursiveCharacterTextSplitter.from_language(
-            language=Language.JS, chunk_size=80, chunk_overlap=0
+            language=Language.JS,
+            chunk_size=self.config["chunk_size"],
+            chunk_overlap=self.config["chunk_overlap"],
         )
 
     def process(self, path) -> List[Document]:
@@ -5,16 +5,22 @@ from typing_extensions import List
 from langchain_core.embeddings import Embeddings
 
 class PDFProcessor:
+    # Chunking configuration, part of the index config hash
+    config = {
+        "processor": "pdf",
+        "splitter": "semantic",
+        "breakpoint_threshold_type": "gradient",
+    }
+
     def __init__(self, embeddings: Embeddings):
         self.splitter = SemanticChunker(
-            embeddings=embeddings, breakpoint_threshold_type="gradient"
+            embeddings=embeddings,
+            breakpoint_threshold_type=self.config["breakpoint_threshold_type"],
         )
 
-    async def process(self, path) -> List[Document]:
+    def process(self, path) -> List[Document]:
         loader = PyPDFLoader(path)
-        pages: List[Document] = []
-        async for page in loader.alazy_load():
-            pages.append(page)
+        pages: List[Document] = list(loader.lazy_load())
 
         print(f"{pages[0].metadata}\n")
         print(pages[0].page_content)
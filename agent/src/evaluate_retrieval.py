@@ -0,0 +1,131 @@
+"""
+Compares fixed-k retrieval with adaptive retrieval on the test corpus.
+
+The corpus (default: resources/) is ingested into a temporary Chroma collection.
+Every evaluation query lists the snippets of the corpus which answer it, and
+for both strategies the following is printed per query and on average:
+    - chunks and characters sent to the grader and the generator
+    - hit: whether any expected snippet was retrieved
+    - recall: share of the expected snippets found in the retrieved chunks
+    - precision: share of the retrieved chunks containing an expected snippet
+
+Usage:
+    python -m src.evaluate_retrieval [--corpus resources] [--k 20] [--queries queries.json]
+
+A queries file holds a list of {"query": "...", "expected": ["snippet", ...]}.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_google_vertexai import VertexAIEmbeddings
+from typing_extensions import Dict, List, Tuple
+
+from src.document_processors.javacript_code_processor import JSCodeDocumentProcessor
+from src.utils import authenticate_vertex_ai
+from src.vector_store.chromadb import ChromaDB
+from src.vector_store.filters import annotate_documents
+from src.vector_store.selection import retrieve
+
+
+DEFAULT_QUERIES = [
+    {
+        "query": "How is the singleton instance of DataService created?",
+        "expected": ["getInstance", "DataService.instance = new DataService()"],
+    },
+    {
+        "query": "Which transaction statuses exist?",
+        "expected": ["enum TransactionStatus", "PENDING = 'PENDING'", "COMPLETED = 'COMPLETED'", "FAILED = 'FAILED'"],
+    },
+    {
+        "query": "How are the user roles defined?",
+        "expected": ["role: 'admin' | 'user'"],
+    },
+    {
+        "query": "How are results of a function cached by its arguments?",
+        "expected": ["const memoize", "cache.has(key)", "cache.set(key, result)"],
+    },
+    {
+        "query": "How are event listeners registered and notified?",
+        "expected": ["on(event: string, callback: Function)", "emit(event: string, data?: any)"],
+    },
+    {
+        "query": "How many times does a day of the month fall on a given weekday in a year?",
+        "expected": ["function countSpecificDayInYear(", "date.getDay() === targetDayOfWeek"],
+    },
+    {
+        "query": "How is a random Ethereum address generated for a name?",
+        "expected": ["function randomHumanNamedAddress(name)", "return '0x' + name + address"],
+    },
+]
+
+
+def score(retrieved: List[Document], expected: List[str]) -> Tuple[float, float]:
+    """Returns the recall of the expected snippets and the precision of the retrieved chunks."""
+
+    found = [snippet for snippet in expected if any(snippet in doc.page_content for doc in retrieved)]
+    relevant = [doc for doc in retrieved if any(snippet in doc.page_content for snippet in expected)]
+    recall = len(found) / len(expected) if expected else 0.0
+    precision = len(relevant) / len(retrieved) if retrieved else 0.0
+    return recall, precision
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed-k and adaptive retrieval")
+    parser.add_argument("--corpus", default="resources")
+    parser.add_argument("--k", type=int, default=20, help="fixed k, also the adaptive maximum")
+    parser.add_argument("--min-k", type=int, default=4)
+    parser.add_argument("--queries", help="JSON file of queries with their expected snippets")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = json.load(f)
+
+    load_dotenv()
+    authenticate_vertex_ai(
+        os.environ.get("GOOGLE_CLOUD_PROJECT"),
+        os.environ.get("LOCATION"),
+        os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+        os.environ.get("BUCKET_URI"),
+    )
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        vector_store = ChromaDB(
+            embeddings=VertexAIEmbeddings(model="text-embedding-005"),
+            persist_directory=persist_directory,
+            collection_name="evaluation",
+        )
+        docs = JSCodeDocumentProcessor().process(args.corpus)
+        vector_store.add(annotate_documents(docs, "evaluation", args.corpus))
+
+        # chunks, characters, hits, recall, precision
+        totals: Dict[str, List[float]] = {"fixed": [0] * 5, "adaptive": [0] * 5}
+        for item in queries:
+            results = {
+                "fixed": vector_store.search(item["query"], k=args.k),
+                "adaptive": retrieve(vector_store, item["query"], min_k=args.min_k, max_k=args.k),
+            }
+            print(item["query"])
+            for strategy, retrieved in results.items():
+                chars = sum(len(doc.page_content) for doc in retrieved)
+                recall, precision = score(retrieved, item["expected"])
+                for i, value in enumerate((len(retrieved), chars, recall > 0, recall, precision)):
+                    totals[strategy][i] += value
+                print(f"  {strategy:<9} {len(retrieved):>3} chunks {chars:>6} characters "
+                      f"hit {'yes' if recall > 0 else 'no':<3} recall {recall:>5.2f} precision {precision:>5.2f}")
+
+        print("Average")
+        for strategy, (chunks, chars, hits, recall, precision) in totals.items():
+            n = len(queries)
+            print(f"  {strategy:<9} {chunks / n:>5.1f} chunks {chars / n:>8.1f} characters "
+                  f"hit rate {hits / n:>5.2f} recall {recall / n:>5.2f} precision {precision / n:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
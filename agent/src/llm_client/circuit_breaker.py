@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker that fails fast while a backend is down. After
+    `failure_threshold` consecutive failures the circuit opens and rejects calls
+    for `recovery_timeout` seconds. Then a single trial call is let through
+    (half-open); its success closes the circuit, its failure opens it again.
+    Attributes:
+        name (str): Name of the protected backend, used in error messages.
+        failure_threshold (int): Consecutive failures that open the circuit.
+        recovery_timeout (float): Seconds to wait before allowing a trial call.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._recovery_elapsed():
+                return self.HALF_OPEN
+            return self._state
+
+    def _recovery_elapsed(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.recovery_timeout
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not reach the backend."""
+
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+
+            if self._state == self.OPEN and self._recovery_elapsed():
+                self._state = self.HALF_OPEN
+
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+
+            raise CircuitOpenError(f"circuit for '{self.name}' is open")
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_throttled(self):
+        """Records a call rejected by quota; the backend is up, so the circuit is left as is."""
+
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
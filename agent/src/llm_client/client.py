@@ -0,0 +1,223 @@
+"""
+Shared, rate limited and fault tolerant clients for chat and embedding models.
+
+Every call goes through a ModelGuard which is shared per model name, so all the
+nodes of the graph and every embedding user compete for the same quota:
+    1. circuit breaker check (fails fast while the backend is down)
+    2. token bucket rate limiting (requests per second)
+    3. AIMD adaptive concurrency limiting (driven by latency and errors)
+    4. retries with jittered exponential backoff on transient errors
+"""
+
+import random
+import threading
+import time
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from google.api_core import exceptions as google_exceptions
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from src.llm_client.circuit_breaker import CircuitBreaker
+from src.llm_client.rate_limiter import AIMDLimiter, TokenBucket
+
+
+# Errors that indicate the backend is up but throttling us; they slow us down
+# but never open the circuit
+THROTTLING_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+)
+
+# Errors that indicate throttling or a temporarily unavailable backend
+RETRYABLE_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+    Attributes:
+        max_attempts (int): Maximum number of attempts including the first one.
+        base_delay (float): Delay in seconds before the first retry.
+        max_delay (float): Upper bound of a single delay in seconds.
+    """
+    def __init__(self,
+                 max_attempts: int = 5,
+                 base_delay: float = 0.5,
+                 max_delay: float = 20.0):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Returns the delay before retrying after the given failed attempt."""
+
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+class ModelGuard:
+    """
+    Combines rate limiting, adaptive concurrency, retries and circuit breaking
+    for calls to a single model.
+    Attributes:
+        name (str): Name of the model.
+        bucket (TokenBucket): Requests per second limiter.
+        limiter (AIMDLimiter): Adaptive concurrency limiter.
+        breaker (CircuitBreaker): Circuit breaker of the backend.
+        retry (RetryPolicy): Retry policy for transient errors.
+        retryable_exceptions (tuple): Exception types treated as transient.
+    """
+    def __init__(self,
+                 name: str,
+                 bucket: TokenBucket,
+                 limiter: AIMDLimiter,
+                 breaker: CircuitBreaker,
+                 retry: RetryPolicy,
+                 retryable_exceptions: Tuple[Type[BaseException], ...] = RETRYABLE_EXCEPTIONS):
+        self.name = name
+        self.bucket = bucket
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retry = retry
+        self.retryable_exceptions = retryable_exceptions
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        # The breaker sees one outcome per logical call, not one per attempt
+        self.breaker.before_call()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.bucket.acquire()
+            self.limiter.acquire()
+
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except self.retryable_exceptions as e:
+                self.limiter.release(time.monotonic() - start, congested=True)
+
+                if attempt >= self.retry.max_attempts:
+                    if isinstance(e, THROTTLING_EXCEPTIONS):
+                        self.breaker.record_throttled()
+                    else:
+                        self.breaker.record_failure()
+                    raise
+
+                delay = self.retry.delay(attempt)
+                print(f"{self.name}: {type(e).__name__} on attempt {attempt}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except Exception:
+                # The backend answered, so it is up; the error is not ours to retry
+                self.limiter.release(time.monotonic() - start)
+                self.breaker.record_success()
+                raise
+
+            self.limiter.release(time.monotonic() - start)
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "circuit": self.breaker.state,
+        }
+
+
+_guards: Dict[str, ModelGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name: str,
+              requests_per_second: float = 10.0,
+              burst: int = 10,
+              max_concurrency: int = 16,
+              latency_target: float = 10.0,
+              max_attempts: int = 5,
+              failure_threshold: int = 5,
+              recovery_timeout: float = 30.0) -> ModelGuard:
+    """
+    Returns the guard shared by every client of the model `name`, creating it on
+    first use. Configuration arguments only apply when the guard is created.
+    """
+
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = ModelGuard(
+                name=name,
+                bucket=TokenBucket(rate=requests_per_second, capacity=burst),
+                limiter=AIMDLimiter(
+                    initial_limit=max(1, max_concurrency // 4),
+                    max_limit=max_concurrency,
+                    latency_target=latency_target,
+                ),
+                breaker=CircuitBreaker(
+                    name,
+                    failure_threshold=failure_threshold,
+                    recovery_timeout=recovery_timeout,
+                ),
+                retry=RetryPolicy(max_attempts=max_attempts),
+            )
+        return _guards[name]
+
+
+class ResilientChatModel(Runnable):
+    """
+    Wraps a chat model (or any runnable derived from it) so that every
+    invocation goes through a ModelGuard. `bind_tools` and
+    `with_structured_output` return wrapped runnables sharing the same guard,
+    and the wrapper can be composed with prompts like the model itself.
+    Attributes:
+        runnable (Runnable): Wrapped chat model or runnable.
+        guard (ModelGuard): Guard shared by all calls to the model.
+    """
+    def __init__(self, runnable: Runnable, guard: ModelGuard):
+        self.runnable = runnable
+        self.guard = guard
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.guard.call(self.runnable.invoke, input, config, **kwargs)
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> "ResilientChatModel":
+        return ResilientChatModel(self.runnable.bind_tools(tools, **kwargs), self.guard)
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> "ResilientChatModel":
+        return ResilientChatModel(self.runnable.with_structured_output(schema, **kwargs), self.guard)
+
+    def __getattr__(self, name: str) -> Any:
+        if "runnable" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.__dict__["runnable"], name)
+
+
+class ResilientEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so that every call goes through a ModelGuard.
+    Attributes:
+        embeddings (Embeddings): Wrapped embedding model.
+        guard (ModelGuard): Guard shared by all calls to the model.
+    """
+    def __init__(self, embeddings: Embeddings, guard: ModelGuard):
+        self.embeddings = embeddings
+        self.guard = guard
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.guard.call(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.guard.call(self.embeddings.embed_query, text)
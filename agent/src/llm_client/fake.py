@@ -0,0 +1,114 @@
+"""
+Local fake models which inject latency and errors.
+
+Use them in place of the Vertex AI models to exercise the rate limiter, the
+adaptive concurrency limiter, retries and the circuit breaker without a backend.
+
+    from src.llm_client.client import ResilientChatModel, get_guard
+    from src.llm_client.fake import FakeChatModel
+
+    llm = ResilientChatModel(
+        FakeChatModel(latency=0.2, error_rate=0.3),
+        get_guard("fake-model", requests_per_second=5),
+    )
+    llm.invoke("hello")
+"""
+
+import hashlib
+import random
+import threading
+import time
+
+from typing import Any, Callable, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+
+def _quota_exceeded() -> Exception:
+    return google_exceptions.ResourceExhausted("Quota exceeded (injected by fake model)")
+
+
+class FaultInjector:
+    """
+    Sleeps and raises errors according to the configured fault profile.
+    Attributes:
+        latency (float): Base latency of a call in seconds.
+        jitter (float): Maximum random latency added to the base latency.
+        error_rate (float): Probability of a call failing.
+        error_factory (Callable): Builds the exception raised on failure.
+        down (bool): When True, every call fails as if the backend was down.
+        seed (int): Seed of the random generator for reproducible runs.
+    """
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_factory: Callable[[], Exception] = _quota_exceeded,
+                 down: bool = False,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_factory = error_factory
+        self.down = down
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def inject(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self.down or self._random.random() < self.error_rate
+            if fail:
+                self.failures += 1
+
+        time.sleep(delay)
+        if fail:
+            raise self.error_factory()
+
+
+class FakeChatModel(Runnable):
+    """
+    Chat model returning canned responses after injected latency and errors.
+    Attributes:
+        responses (List[str]): Responses returned in a round-robin fashion.
+        faults (FaultInjector): Fault profile applied to every call.
+    """
+    def __init__(self, responses: Optional[List[str]] = None, **fault_kwargs: Any):
+        self.responses = responses or ["fake response"]
+        self.faults = FaultInjector(**fault_kwargs)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AIMessage:
+        self.faults.inject()
+        return AIMessage(content=self.responses[(self.faults.calls - 1) % len(self.responses)])
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embedding model returning deterministic pseudo-random vectors after injected
+    latency and errors.
+    Attributes:
+        dimension (int): Size of the returned vectors.
+        faults (FaultInjector): Fault profile applied to every call.
+    """
+    def __init__(self, dimension: int = 768, **fault_kwargs: Any):
+        self.dimension = dimension
+        self.faults = FaultInjector(**fault_kwargs)
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+        rng = random.Random(seed)
+        return [rng.uniform(-1, 1) for _ in range(self.dimension)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.faults.inject()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.faults.inject()
+        return self._embed(text)
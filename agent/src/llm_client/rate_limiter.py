@@ -0,0 +1,112 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Tokens are refilled continuously at `rate` tokens
+    per second up to `capacity`, and each call consumes one token.
+    Attributes:
+        rate (float): Number of tokens added per second.
+        capacity (int): Maximum number of tokens the bucket can hold (burst size).
+    """
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens: float = 1):
+        """Blocks until `tokens` tokens are available, then consumes them."""
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limiter using additive-increase/multiplicative-decrease.
+    The limit grows by roughly one slot per window of successful calls whose
+    latency stays under `latency_target`, and is cut by `decrease_factor` when a
+    call is throttled, fails, or is slower than the target.
+    Attributes:
+        initial_limit (int): Starting number of concurrent calls allowed.
+        min_limit (int): Lower bound of the concurrency limit.
+        max_limit (int): Upper bound of the concurrency limit.
+        latency_target (float): Latency in seconds above which the limit is decreased.
+        decrease_factor (float): Multiplier applied to the limit on congestion.
+    """
+    def __init__(self,
+                 initial_limit: int = 4,
+                 min_limit: int = 1,
+                 max_limit: int = 32,
+                 latency_target: float = 10.0,
+                 decrease_factor: float = 0.5):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("limits must satisfy 1 <= min <= initial <= max")
+
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        """Blocks until a concurrency slot is available."""
+
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, congested: bool = False):
+        """
+        Releases a slot and adjusts the limit based on the observed outcome.
+        Args:
+            latency (float): Duration of the call in seconds.
+            congested (bool): Whether the call was throttled or failed.
+        """
+
+        with self._condition:
+            self._in_flight -= 1
+
+            if congested or latency > self.latency_target:
+                self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            else:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+            self._condition.notify_all()
@@ -0,0 +1,230 @@
+"""
+On-demand sampling profiler for single agent runs.
+
+A sampled request is run while a background thread periodically captures the
+stacks of the request thread and of the threads started for it. The samples
+are stored as a speedscope profile (https://www.speedscope.app), one profile
+per thread, next to a metadata file holding the per-node timings of the graph.
+Requests which are not sampled do not start the profiler, so profiling costs
+nothing when it is off.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class SamplingProfiler:
+    """
+    Samples, from a background thread, the stack of one thread and of every
+    thread started while it is profiled, such as the worker threads LangGraph
+    runs tools on. Threads of pools started before the profiler are not
+    sampled; time spent waiting on them shows up in the waiting thread. Threads
+    started by concurrent requests are sampled as well.
+    Attributes:
+        thread_id (int): Identifier of the profiled thread.
+        interval (float): Seconds between two samples.
+    """
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames: List[Dict[str, Any]] = []
+        # Samples and weights per sampled thread, keyed on the thread identifier
+        self.threads: Dict[int, Dict[str, Any]] = {}
+        self.duration = 0.0
+        self._started_at = 0.0
+        self._excluded: Set[int] = set()
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def samples(self) -> int:
+        return sum(len(thread["samples"]) for thread in self.threads.values())
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self._frame_index:
+            self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+        return self._frame_index[key]
+
+    def _thread_samples(self, thread_id: int) -> Dict[str, Any]:
+        if thread_id not in self.threads:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.threads[thread_id] = {
+                "name": names.get(thread_id, str(thread_id)),
+                "samples": [],
+                "weights": [],
+            }
+        return self.threads[thread_id]
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+
+            for thread_id, frame in frames.items():
+                if thread_id in self._excluded:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+
+                thread = self._thread_samples(thread_id)
+                thread["samples"].append(stack)
+                thread["weights"].append(now - last)
+            last = now
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        # Threads running before the profiler, except the profiled one, are not ours
+        self._excluded = set(sys._current_frames()) - {self.thread_id}
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        self._excluded.add(self._thread.ident)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started_at
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        """Returns one sampled profile per thread, the profiled thread first."""
+
+        thread_ids = sorted(self.threads, key=lambda thread_id: thread_id != self.thread_id)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "agentic-rag-app",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{name} [{self.threads[thread_id]['name']}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": self.threads[thread_id]["samples"],
+                "weights": self.threads[thread_id]["weights"],
+            } for thread_id in thread_ids],
+        }
+
+
+class ProfileStore:
+    """
+    Keeps the most recent profiles on disk.
+    Attributes:
+        directory (str): Directory of the profiles.
+        max_profiles (int): Number of profiles kept, older ones are deleted.
+    """
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def profile_path(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+
+        path = os.path.join(self.directory, f"{profile_id}.speedscope.json")
+        return path if os.path.isfile(path) else None
+
+    def _metadata_path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.meta.json")
+
+    def save(self, profile_id: str, profile: Dict[str, Any], metadata: Dict[str, Any]):
+        with self._lock:
+            with open(os.path.join(self.directory, f"{profile_id}.speedscope.json"), "w") as f:
+                json.dump(profile, f)
+            with open(self._metadata_path(profile_id), "w") as f:
+                json.dump(metadata, f)
+
+            for stale in self.list()[self.max_profiles:]:
+                for suffix in ("speedscope.json", "meta.json"):
+                    try:
+                        os.unlink(os.path.join(self.directory, f"{stale['id']}.{suffix}"))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Returns the metadata of the stored profiles, most recent first."""
+
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".meta.json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+def should_profile(header_value: Optional[str], sample_rate: float) -> bool:
+    """Whether to profile a request, either requested by header or sampled."""
+
+    if header_value and header_value.lower() in ("1", "true", "yes"):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def profile_call(store: ProfileStore,
+                 fn: Callable[[List[Dict[str, Any]]], Any],
+                 name: str,
+                 interval: float = 0.005,
+                 tags: Optional[Dict[str, Any]] = None) -> Tuple[Any, str]:
+    """
+    Runs `fn` under the sampling profiler and stores the profile.
+    Args:
+        store (ProfileStore): Store of the profile.
+        fn (Callable): Function to profile, it receives a list to append per-node timings to.
+        name (str): Name of the profile.
+        interval (float): Seconds between two samples.
+        tags (dict, optional): Additional metadata of the profile.
+    Returns:
+        Tuple[Any, str]: Result of `fn` and the profile id.
+    """
+
+    profile_id = uuid.uuid4().hex
+    node_timings: List[Dict[str, Any]] = []
+    profiler = SamplingProfiler(threading.get_ident(), interval)
+
+    profiler.start()
+    try:
+        result = fn(node_timings)
+    finally:
+        profiler.stop()
+        store.save(profile_id, profiler.to_speedscope(name), {
+            "id": profile_id,
+            "name": name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": profiler.duration,
+            "samples": profiler.samples,
+            "threads": [
+                {"name": thread["name"], "samples": len(thread["samples"])}
+                for thread in profiler.threads.values()
+            ],
+            "node_timings": node_timings,
+            **(tags or {}),
+        })
+
+    return result, profile_id
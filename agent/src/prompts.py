@@ -80,3 +80,18 @@ def grade_relevance_prompt_template():
         Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
         input_variables=["context", "question"],
     )
+
+def summarize_conversation_prompt(summary: str, conversation: str):
+    return HumanMessage(
+        content=f"""\n
+        You are an assistant summarizing a conversation between a user and an assistant.\n\n
+        Here is the summary of the conversation so far:\n{summary}\n\n
+        Here are the messages to add to the summary:\n{conversation}\n\n
+
+        Extend the summary with the messages.
+        Keep the facts, names, code identifiers and decisions needed to answer follow-up questions,
+        and leave out everything else.
+        The summary should not be longer than 200 words.
+        \n\n
+        """,
+    )
@@ -0,0 +1,176 @@
+"""
+Execution layer in front of JSCodeExecutor.
+
+    1. syntax pre-check with esprima, rejecting broken code without spawning Node;
+       code using syntax newer than esprima knows is left to Node to judge
+    2. result cache for deterministic code, keyed on the normalized code and args
+    3. output size capping
+    4. execution time and cache hit-rate metrics
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import esprima
+
+from src.tools.javascript_executor.tool import JSCodeExecutor
+
+
+# Sources of non-determinism or I/O; code referring to them is never cached.
+# Any `random` identifier is flagged, as are uses of Math other than plain member
+# access (`Math[...]`, `const {random} = Math`, `const M = Math`) and dynamic
+# lookups of globals, since `Math.random` can be reached through all of them
+NON_DETERMINISTIC_PATTERN = re.compile(
+    r"\b(Date|performance|process|require|import|fetch|setTimeout|setInterval|"
+    r"setImmediate|crypto|XMLHttpRequest|WebSocket|Intl|random|eval|Function|"
+    r"globalThis|global|window|self|Reflect)\b"
+    r"|\bMath\b(?!\s*\.)"
+)
+
+# Syntax esprima (ES2017) cannot parse: optional chaining, nullish coalescing,
+# logical assignment, numeric separators, BigInt literals, optional catch
+# bindings, async generators and iteration, named groups, lookbehinds and
+# Unicode property escapes in regular expressions, and class fields (matched
+# loosely on any class)
+MODERN_SYNTAX_PATTERN = re.compile(
+    r"\?\.(?!\d)|\?\?|\|\|=|&&=|\d_\d|\b\d+n\b|\bcatch\s*\{|\bfor\s+await\b|\(\?<|\bclass\b"
+    r"|\basync\s*(function\s*)?\*|\\[pP]\{"
+)
+
+
+class ExecutionStats:
+    """Counters of the execution layer."""
+
+    def __init__(self):
+        self.requests = 0
+        self.syntax_errors = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.executions = 0
+        self.execution_seconds = 0.0
+        self.truncated_outputs = 0
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "requests": self.requests,
+                "syntax_errors": self.syntax_errors,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "executions": self.executions,
+                "execution_seconds": self.execution_seconds,
+                "avg_execution_seconds": self.execution_seconds / self.executions if self.executions else 0.0,
+                "truncated_outputs": self.truncated_outputs,
+            }
+
+
+def check_syntax(code: str) -> Optional[str]:
+    """
+    Returns the syntax error of the code, or None if it is valid. esprima does not
+    know syntax newer than ES2017, so its rejection of code which may use such
+    syntax is not trusted; that code is passed on and Node reports its errors.
+    """
+
+    try:
+        esprima.parseScript(code)
+        return None
+    except esprima.Error as e:
+        if MODERN_SYNTAX_PATTERN.search(code):
+            return None
+        return str(e)
+
+
+def normalize_code(code: str) -> str:
+    """
+    Returns the code without comments and formatting differences. Line breaks
+    between tokens are kept, as automatic semicolon insertion depends on them
+    (`return\\n42` returns undefined).
+    """
+
+    try:
+        tokens = esprima.tokenize(code, {"loc": True})
+    except esprima.Error:
+        return code.strip()
+
+    parts = []
+    previous_line = None
+    for token in tokens:
+        if previous_line is not None:
+            parts.append("\n" if token.loc.start.line > previous_line else " ")
+        parts.append(token.value)
+        previous_line = token.loc.end.line
+    return "".join(parts)
+
+
+def is_deterministic(code: str) -> bool:
+    return NON_DETERMINISTIC_PATTERN.search(code) is None
+
+
+class JSExecutionLayer:
+    """
+    Validates, caches and caps the execution of JavaScript code.
+    Attributes:
+        cache_size (int): Maximum number of cached results.
+        max_output_chars (int): Maximum number of characters of a returned output.
+        stats (ExecutionStats): Metrics of the layer.
+    """
+    def __init__(self, cache_size: int = 256, max_output_chars: int = 10000):
+        self.cache_size = cache_size
+        self.max_output_chars = max_output_chars
+        self.stats = ExecutionStats()
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cap(self, output: str) -> str:
+        if len(output) <= self.max_output_chars:
+            return output
+
+        self.stats.increment("truncated_outputs")
+        omitted = len(output) - self.max_output_chars
+        return f"{output[:self.max_output_chars]}\n... [output truncated, {omitted} characters omitted]"
+
+    def execute(self, code: str, args: List[Any] = None) -> str:
+        self.stats.increment("requests")
+
+        syntax_error = check_syntax(code)
+        if syntax_error:
+            self.stats.increment("syntax_errors")
+            return f"JavaScript syntax error: {syntax_error}"
+
+        key = None
+        if is_deterministic(code):
+            normalized = f"{normalize_code(code)}\0{json.dumps(args, sort_keys=True)}"
+            key = hashlib.sha256(normalized.encode()).hexdigest()
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.stats.increment("cache_hits")
+                    return self._cache[key]
+            self.stats.increment("cache_misses")
+
+        start = time.monotonic()
+        output = self._cap(JSCodeExecutor.execute(code, args))
+        self.stats.increment("executions")
+        self.stats.increment("execution_seconds", time.monotonic() - start)
+
+        # Failures of the executor itself (e.g. node missing) are not a property of the code
+        if key is not None and not output.startswith("Error: "):
+            with self._lock:
+                self._cache[key] = output
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return output
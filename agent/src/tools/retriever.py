@@ -6,11 +6,17 @@ from langchain_core.tools import BaseTool
 from langchain_google_vertexai import VertexAIEmbeddings
 from pydantic import BaseModel, Field
 
+from src.llm_client.client import ResilientEmbeddings, get_guard
 from src.vector_store.chromadb import ChromaDB
+from src.vector_store.filters import SearchFilter
+from src.vector_store.selection import retrieve
 
 
 vector_store = ChromaDB(
-    embeddings=VertexAIEmbeddings(model="text-embedding-005"),
+    embeddings=ResilientEmbeddings(
+        VertexAIEmbeddings(model="text-embedding-005", max_retries=0),
+        get_guard("text-embedding-005"),
+    ),
     collection_name="js_code_collection",
 )
 
@@ -35,9 +41,15 @@ class Retriever(BaseTool):  # type: ignore[override]
         """
     )
     args_schema: Optional[Type[BaseModel]] = RetrieverInput
+    search_filter: Optional[SearchFilter] = None
+    k: int = 4
+    # Adaptive depth within min_k..max_k instead of a fixed k
+    adaptive: bool = False
+    min_k: int = 2
+    max_k: int = 8
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, search_filter: Optional[SearchFilter] = None) -> None:
+        super().__init__(search_filter=search_filter)
         self.metadata = {
             "name": self.name,
             "description": self.description,
@@ -52,7 +64,16 @@ class Retriever(BaseTool):  # type: ignore[override]
     ) -> str:
         """Use the tool."""
         try:
-            retrieved_docs = vector_store.search(query, k=4)
+            if self.adaptive:
+                retrieved_docs = retrieve(
+                    vector_store,
+                    query,
+                    min_k=self.min_k,
+                    max_k=self.max_k,
+                    search_filter=self.search_filter,
+                )
+            else:
+                retrieved_docs = vector_store.search(query, k=self.k, search_filter=self.search_filter)
             serialized = "\n\n".join(
                 (f"Source: {doc.metadata}\n" f"Content: {doc.page_content}")
                 for doc in retrieved_docs
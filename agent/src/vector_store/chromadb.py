@@ -1,14 +1,48 @@
+import threading
+import time
+
+import chromadb
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Tuple, TypeVar
 from typing_extensions import List
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_chroma import Chroma
 
+from src.vector_store.filters import (
+    DEFAULT_NAMESPACE,
+    NAMESPACE_KEY,
+    SearchFilter,
+    collection_name,
+)
+
+
+# Candidates fetched per requested result when filtering on path prefix,
+# which Chroma cannot push down
+PATH_PREFIX_OVERSAMPLING = 4
+
+# Seconds the list of namespace collections is cached, so that collections
+# created by other processes are eventually searched too
+COLLECTION_CACHE_TTL = 30.0
+
+# Namespace collections queried concurrently by a search over several namespaces
+SEARCH_WORKERS = 8
+
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 class ChromaDB:
     """
     Vector store implementation for ChromaDB that uses the Chroma library to store and retrieve
     vector embeddings. It allows for efficient similarity search and retrieval of
     documents based on their vector representations.
+    Each namespace is stored in its own collection, so that a search only scans
+    the namespaces it asks for. A search without a namespace filter queries every
+    namespace collection, concurrently on up to `SEARCH_WORKERS` threads, so its
+    cost still grows with the number of namespaces.
     Attributes:
         embeddings (Embeddings): Embedding function to convert documents into vector representations.
         persist_directory (str): Directory to persist the vector store data.
@@ -18,15 +52,157 @@ class ChromaDB:
                  embeddings: Embeddings,
                  persist_directory: str = "./chroma_langchain_db",
                  collection_name: str = "example_collection"):
-        self.vector_store = Chroma(
-            collection_name,
-            embedding_function=embeddings,
-            persist_directory=persist_directory,
-        )
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self._collections: Dict[str, Chroma] = {}
+        self._raw_collections: Dict[str, chromadb.Collection] = {}
+        self._collection_names: Set[str] = set()
+        self._collection_names_at = float("-inf")
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="chroma-search")
+        self.vector_store = self._collection(collection_name)
+
+    def _collection(self, name: str) -> Chroma:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = Chroma(
+                    name,
+                    embedding_function=self.embeddings,
+                    client=self.client,
+                )
+                self._collection_names.add(name)
+            return self._collections[name]
+
+    def _raw_collection(self, name: str) -> chromadb.Collection:
+        with self._lock:
+            if name not in self._raw_collections:
+                self._raw_collections[name] = self.client.get_collection(name)
+            return self._raw_collections[name]
+
+    def _existing_collection_names(self) -> Set[str]:
+        with self._lock:
+            if time.monotonic() - self._collection_names_at >= COLLECTION_CACHE_TTL:
+                self._collection_names = {getattr(c, "name", c) for c in self.client.list_collections()}
+                self._collection_names_at = time.monotonic()
+            return set(self._collection_names)
+
+    def _namespace_collection_names(self, namespaces: Optional[List[str]]) -> List[str]:
+        existing = self._existing_collection_names()
+        if namespaces:
+            names = {collection_name(self.collection_name, ns) for ns in namespaces} & existing
+        else:
+            names = {
+                name for name in existing
+                if name == self.collection_name or name.startswith(f"{self.collection_name}__")
+            }
+
+        return sorted(names)
+
+    def _namespace_collections(self, namespaces: Optional[List[str]]) -> List[Chroma]:
+        return [self._collection(name) for name in self._namespace_collection_names(namespaces)]
+
+    def _fan_out(self, fn: Callable[[T], R], items: List[T]) -> List[R]:
+        """Applies `fn` to every item, concurrently when there is more than one."""
+
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
 
     def add(self, documents: List[Document]) -> int:
-        doc_ids = self.vector_store.add_documents(documents=documents)
-        return len(doc_ids)
+        by_namespace: Dict[str, List[Document]] = {}
+        for doc in documents:
+            namespace = doc.metadata.get(NAMESPACE_KEY, DEFAULT_NAMESPACE)
+            by_namespace.setdefault(namespace, []).append(doc)
+
+        count = 0
+        for namespace, docs in by_namespace.items():
+            collection = self._collection(collection_name(self.collection_name, namespace))
+            count += len(collection.add_documents(documents=docs))
+        return count
+
+    def search(self, query: str, k: int, search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        search_filter = search_filter or SearchFilter()
+        collections = self._namespace_collections(search_filter.namespaces)
+        if not collections:
+            return []
+
+        if len(collections) == 1 and search_filter.is_empty():
+            return collections[0].similarity_search(query=query, k=k)
+
+        fetch_k = k * PATH_PREFIX_OVERSAMPLING if search_filter.path_prefix else k
+        where = search_filter.chroma_where()
+        query_embedding = self.embeddings.embed_query(query)
+
+        # Distances are comparable across collections as they share the embedding model
+        results = [
+            result
+            for collection_results in self._fan_out(
+                lambda collection: collection.similarity_search_by_vector_with_relevance_scores(
+                    embedding=query_embedding, k=fetch_k, filter=where,
+                ),
+                collections,
+            )
+            for result in collection_results
+        ]
+        results.sort(key=lambda result: result[1])
+
+        docs = [doc for doc, _ in results if search_filter.matches(doc.metadata)]
+        return docs[:k]
+
+    def search_with_vectors(self,
+                            query: str,
+                            fetch_k: int,
+                            search_filter: Optional[SearchFilter] = None,
+                            ) -> Tuple[List[float], List[Document], np.ndarray, np.ndarray]:
+        """
+        Returns the query embedding and up to `fetch_k` documents with their cosine
+        similarity scores in descending order and their stored embeddings.
+        """
+
+        search_filter = search_filter or SearchFilter()
+        query_embedding = self.embeddings.embed_query(query)
+        n_results = fetch_k * PATH_PREFIX_OVERSAMPLING if search_filter.path_prefix else fetch_k
+        where = search_filter.chroma_where()
+
+        def query(name: str) -> dict:
+            return self._raw_collection(name).query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=where,
+                include=["documents", "metadatas", "embeddings"],
+            )
+
+        docs, vectors = [], []
+        for result in self._fan_out(query, self._namespace_collection_names(search_filter.namespaces)):
+            if not result["ids"] or not result["ids"][0]:
+                continue
+
+            for doc_id, content, metadata, vector in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], result["embeddings"][0],
+            ):
+                metadata = metadata or {}
+                if search_filter.matches(metadata):
+                    docs.append(Document(id=doc_id, page_content=content, metadata=metadata))
+                    vectors.append(vector)
+
+        if not docs:
+            return query_embedding, [], np.empty(0, dtype=np.float32), np.empty((0, 0), dtype=np.float32)
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1)
+        scores = (vectors @ query_vector) / np.where(norms == 0, 1, norms)
+
+        order = np.argsort(-scores)[:fetch_k]
+        return query_embedding, [docs[i] for i in order], scores[order], vectors[order]
+
+    def export(self) -> dict:
+        """Returns ids, embeddings, documents and metadatas of every namespace."""
 
-    def search(self, query: str, k: int) -> List[Document]:
-        return self.vector_store.similarity_search(query=query, k=k)
+        data = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+        for collection in self._namespace_collections(None):
+            exported = collection.get(include=["embeddings", "documents", "metadatas"])
+            for key in data:
+                data[key].extend(list(exported[key]))
+        return data
@@ -0,0 +1,122 @@
+"""
+Namespaces and metadata filters of the vector stores.
+
+Every document gets the following metadata at ingestion:
+    namespace       repository, upload or tenant the document belongs to
+    path            path of the source file relative to the ingested directory
+    extension       extension of the source file, e.g. ".js"
+    symbol_kind     kind of the chunk, e.g. "functions_classes" or "simplified_code"
+                    for code parsed by LanguageParser, "text" otherwise
+
+Namespaces select the collections (Chroma) or restricts (Vertex AI Vector Search)
+to search, the other filters are pushed down to the store where it supports them.
+"""
+
+import hashlib
+import os
+import re
+
+from typing import Optional
+
+from langchain_core.documents import Document
+from pydantic import BaseModel, Field
+from typing_extensions import List
+
+
+DEFAULT_NAMESPACE = "default"
+
+NAMESPACE_KEY = "namespace"
+PATH_KEY = "path"
+EXTENSION_KEY = "extension"
+SYMBOL_KIND_KEY = "symbol_kind"
+
+
+class SearchFilter(BaseModel):
+    """Metadata filter of a search. Unset fields do not filter."""
+
+    namespaces: Optional[List[str]] = Field(default=None, description="Namespaces to search in")
+    path_prefix: Optional[str] = Field(default=None, description="Prefix of the relative source path")
+    extensions: Optional[List[str]] = Field(default=None, description="File extensions, e.g. '.js'")
+    symbol_kinds: Optional[List[str]] = Field(default=None, description="Kinds of the chunks")
+
+    def is_empty(self) -> bool:
+        return not (self.namespaces or self.path_prefix or self.extensions or self.symbol_kinds)
+
+    def chroma_where(self) -> Optional[dict]:
+        """
+        Returns the Chroma `where` clause of the filter. Namespaces are resolved
+        to collections and path prefixes are not supported by Chroma, so neither
+        of them is part of the clause.
+        """
+
+        conditions = []
+        if self.extensions:
+            conditions.append({EXTENSION_KEY: {"$in": self.extensions}})
+        if self.symbol_kinds:
+            conditions.append({SYMBOL_KIND_KEY: {"$in": self.symbol_kinds}})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def vertex_restricts(self) -> list:
+        """Returns the Vertex AI Vector Search restricts of the filter."""
+
+        from google.cloud.aiplatform.matching_engine.matching_engine_index_endpoint import Namespace
+
+        restricts = []
+        if self.namespaces:
+            restricts.append(Namespace(name=NAMESPACE_KEY, allow_tokens=self.namespaces, deny_tokens=[]))
+        if self.extensions:
+            restricts.append(Namespace(name=EXTENSION_KEY, allow_tokens=self.extensions, deny_tokens=[]))
+        if self.symbol_kinds:
+            restricts.append(Namespace(name=SYMBOL_KIND_KEY, allow_tokens=self.symbol_kinds, deny_tokens=[]))
+        return restricts
+
+    def matches(self, metadata: dict) -> bool:
+        if self.namespaces and metadata.get(NAMESPACE_KEY, DEFAULT_NAMESPACE) not in self.namespaces:
+            return False
+        if self.path_prefix and not metadata.get(PATH_KEY, "").startswith(self.path_prefix):
+            return False
+        if self.extensions and metadata.get(EXTENSION_KEY) not in self.extensions:
+            return False
+        if self.symbol_kinds and metadata.get(SYMBOL_KIND_KEY) not in self.symbol_kinds:
+            return False
+        return True
+
+
+def annotate_documents(documents: List[Document], namespace: str, root: str) -> List[Document]:
+    """
+    Sets the namespace, path, extension and symbol kind metadata of documents
+    ingested from `root`, which is either a directory or a single file.
+    """
+
+    base_dir = root if os.path.isdir(root) else os.path.dirname(root)
+    for doc in documents:
+        source = doc.metadata.get("source", root)
+        doc.metadata[NAMESPACE_KEY] = namespace
+        doc.metadata[PATH_KEY] = os.path.relpath(source, base_dir)
+        doc.metadata[EXTENSION_KEY] = os.path.splitext(source)[1].lower()
+        doc.metadata[SYMBOL_KIND_KEY] = doc.metadata.get("content_type", "text")
+
+    return documents
+
+
+def collection_name(base_name: str, namespace: Optional[str]) -> str:
+    """
+    Returns the name of the Chroma collection holding a namespace. The default
+    namespace lives in the base collection.
+    """
+
+    if not namespace or namespace == DEFAULT_NAMESPACE:
+        return base_name
+
+    # Chroma collection names are limited to 63 characters of [a-zA-Z0-9._-],
+    # a digest keeps sanitized or truncated namespaces apart
+    suffix = re.sub(r"[^a-zA-Z0-9_-]", "-", namespace)
+    name = f"{base_name}__{suffix}"
+    if suffix == namespace and len(name) <= 63 and name[-1].isalnum():
+        return name
+
+    digest = hashlib.sha256(namespace.encode()).hexdigest()[:12]
+    return f"{name[:50]}-{digest}"
@@ -0,0 +1,412 @@
+"""
+Versioned, immutable index artifacts built from the vector store.
+
+An artifact is a directory under an artifact root:
+
+    <root>/
+        CURRENT                     name of the promoted version
+        <version>/
+            manifest.json           version, config and config hash, checksums
+            embeddings.npy          L2-normalized float32 matrix (memory-mapped)
+            records.jsonl.gz        ids, documents and metadatas (compressed)
+
+Artifacts are built into a temporary directory and renamed into place, so a
+version directory is either complete or absent. Promotion atomically replaces
+the CURRENT pointer, which lets a new index be built offline and rolled out to
+every replica that loads the root read-only.
+
+Usage:
+    python -m src.vector_store.index_artifact --root ./index_artifacts export --promote
+    python -m src.vector_store.index_artifact --root ./index_artifacts promote <version>
+    python -m src.vector_store.index_artifact --root ./index_artifacts list
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+import numpy as np
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from typing_extensions import List
+
+from src.vector_store.chromadb import ChromaDB
+from src.vector_store.filters import DEFAULT_NAMESPACE, NAMESPACE_KEY, SearchFilter
+
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.jsonl.gz"
+CURRENT_FILE = "CURRENT"
+
+
+def index_config(embeddings_model: str, processor_config: dict) -> dict:
+    """Returns the configuration an index depends on."""
+
+    return {"embeddings_model": embeddings_model, "processor": processor_config}
+
+
+def config_hash(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def _file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, content: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def export_artifact(data: dict, root: str, config: dict, version: Optional[str] = None) -> str:
+    """
+    Builds an immutable artifact from exported vector store data.
+    Args:
+        data (dict): ids, embeddings, documents and metadatas of the collection.
+        root (str): Artifact root directory.
+        config (dict): Chunking and embedding configuration of the index.
+        version (str, optional): Version name. Defaults to a timestamp.
+    Returns:
+        str: The version of the built artifact.
+    """
+
+    hashed_config = config_hash(config)
+    if not version:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        version = f"{timestamp}-{hashed_config[:8]}"
+
+    target_dir = os.path.join(root, version)
+    if os.path.exists(target_dir):
+        raise ValueError(f"artifact version '{version}' already exists")
+
+    embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+    if embeddings.ndim != 2 or len(embeddings) != len(data["ids"]):
+        raise ValueError("exported data has no embeddings or is inconsistent")
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+    os.makedirs(root, exist_ok=True)
+    build_dir = os.path.join(root, f".build-{version}")
+    os.makedirs(build_dir)
+    try:
+        np.save(os.path.join(build_dir, EMBEDDINGS_FILE), embeddings)
+
+        with gzip.open(os.path.join(build_dir, RECORDS_FILE), "wt", encoding="utf-8") as f:
+            for doc_id, document, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+                f.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata or {}}))
+                f.write("\n")
+
+        manifest = {
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "count": int(embeddings.shape[0]),
+            "dimension": int(embeddings.shape[1]),
+            "config": config,
+            "config_hash": hashed_config,
+            "checksums": {
+                name: _file_checksum(os.path.join(build_dir, name))
+                for name in (EMBEDDINGS_FILE, RECORDS_FILE)
+            },
+        }
+        with open(os.path.join(build_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        for name in (EMBEDDINGS_FILE, RECORDS_FILE, MANIFEST_FILE):
+            os.chmod(os.path.join(build_dir, name), 0o444)
+
+        os.rename(build_dir, target_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    return version
+
+
+def read_manifest(root: str, version: str) -> dict:
+    with open(os.path.join(root, version, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def verify_artifact(root: str, version: str) -> dict:
+    """Checks the files of an artifact against its manifest and returns the manifest."""
+
+    manifest = read_manifest(root, version)
+    for name, checksum in manifest["checksums"].items():
+        if _file_checksum(os.path.join(root, version, name)) != checksum:
+            raise ValueError(f"artifact '{version}' is corrupted: checksum mismatch of {name}")
+    return manifest
+
+
+def promote(root: str, version: str):
+    """Atomically points CURRENT to the given, verified version."""
+
+    verify_artifact(root, version)
+    _write_atomic(os.path.join(root, CURRENT_FILE), version)
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+class IndexArtifact:
+    """
+    Loaded, read-only index artifact. Embeddings are memory-mapped.
+    Attributes:
+        manifest (dict): Manifest of the artifact.
+        embeddings (np.ndarray): L2-normalized embeddings, one row per document.
+        documents (List[Document]): Documents in the same order as the embeddings.
+    """
+    def __init__(self, root: str, version: str):
+        path = os.path.join(root, version)
+        self.manifest = read_manifest(root, version)
+        self.embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+
+        self.documents: List[Document] = []
+        with gzip.open(os.path.join(path, RECORDS_FILE), "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.documents.append(Document(
+                    id=record["id"],
+                    page_content=record["document"],
+                    metadata=record["metadata"],
+                ))
+
+        # Rows of every namespace, so that a search only scores its namespaces
+        rows_by_namespace = {}
+        for i, doc in enumerate(self.documents):
+            namespace = doc.metadata.get(NAMESPACE_KEY, DEFAULT_NAMESPACE)
+            rows_by_namespace.setdefault(namespace, []).append(i)
+        self.namespace_rows = {
+            namespace: np.asarray(rows, dtype=np.int64)
+            for namespace, rows in rows_by_namespace.items()
+        }
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    def _rows(self, search_filter: Optional[SearchFilter]) -> Optional[np.ndarray]:
+        """Returns the rows matching the filter, or None for all rows."""
+
+        if search_filter is None or search_filter.is_empty():
+            return None
+
+        if search_filter.namespaces:
+            rows = np.concatenate([
+                self.namespace_rows.get(ns, np.empty(0, dtype=np.int64))
+                for ns in search_filter.namespaces
+            ])
+        else:
+            rows = np.arange(len(self.documents))
+
+        if not (search_filter.path_prefix or search_filter.extensions or search_filter.symbol_kinds):
+            return rows
+
+        return np.asarray(
+            [i for i in rows if search_filter.matches(self.documents[i].metadata)],
+            dtype=np.int64,
+        )
+
+    def search_with_scores(self,
+                           query_embedding: List[float],
+                           k: int,
+                           search_filter: Optional[SearchFilter] = None,
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the rows of the top `k` documents and their scores in descending order."""
+
+        rows = self._rows(search_filter)
+        if not self.documents or (rows is not None and len(rows) == 0):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        scores = (self.embeddings if rows is None else self.embeddings[rows]) @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top_scores = scores[top]
+        if rows is not None:
+            top = rows[top]
+        return top, top_scores
+
+    def search(self,
+               query_embedding: List[float],
+               k: int,
+               search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        top, _ = self.search_with_scores(query_embedding, k, search_filter)
+        return [self.documents[i] for i in top]
+
+
+class ArtifactVectorStore:
+    """
+    Read-only vector store serving the promoted index artifact. A background
+    thread checks the CURRENT pointer every `refresh_interval` seconds, and a
+    newly promoted version is verified, loaded and swapped in without a restart
+    and off the request path. A version failing to load is logged and skipped,
+    the current artifact keeps being served.
+    Attributes:
+        embeddings (Embeddings): Embedding function used to embed the queries.
+        root (str): Artifact root directory.
+        expected_config_hash (str, optional): Config hash the artifact must match.
+        refresh_interval (float): Seconds between checks of the CURRENT pointer.
+    """
+    def __init__(self,
+                 embeddings: Embeddings,
+                 root: str,
+                 expected_config_hash: Optional[str] = None,
+                 refresh_interval: float = 30.0):
+        self.embeddings = embeddings
+        self.root = root
+        self.expected_config_hash = expected_config_hash
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._rejected_version: Optional[str] = None
+        self.artifact: Optional[IndexArtifact] = None
+
+        # The first load happens at startup, so a broken artifact fails loudly
+        self._load(current_version(root))
+        if self.artifact is None:
+            raise ValueError(f"no usable promoted index artifact found in '{root}'")
+
+        self._watcher = threading.Thread(target=self._watch, name="index-artifact-watcher", daemon=True)
+        self._watcher.start()
+
+    def _load(self, version: Optional[str]):
+        if version is None:
+            return
+
+        manifest = verify_artifact(self.root, version)
+        if self.expected_config_hash and manifest["config_hash"] != self.expected_config_hash:
+            print(f"Index artifact '{version}' was built with a different config, keeping the current one")
+            self._rejected_version = version
+            return
+
+        artifact = IndexArtifact(self.root, version)
+        # Swapping the reference is atomic; in-flight searches finish on the old artifact
+        self.artifact = artifact
+        print(f"Loaded index artifact '{version}' ({manifest['count']} documents)")
+
+    def refresh(self):
+        """Loads the promoted version if it changed, keeping the current artifact on failure."""
+
+        with self._lock:
+            version = None
+            try:
+                version = current_version(self.root)
+                if version is None or version in (self._rejected_version, self.artifact.version):
+                    return
+                self._load(version)
+            except Exception as e:
+                print(f"Failed to load index artifact '{version}', keeping '{self.artifact.version}': {e}")
+                self._rejected_version = version
+
+    def _watch(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
+
+    def add(self, documents: List[Document]) -> int:
+        raise RuntimeError("index artifacts are read-only, ingest into the source vector store and export")
+
+    def search(self, query: str, k: int, search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        return self.artifact.search(self.embeddings.embed_query(query), k, search_filter)
+
+    def search_with_vectors(self,
+                            query: str,
+                            fetch_k: int,
+                            search_filter: Optional[SearchFilter] = None,
+                            ) -> Tuple[List[float], List[Document], np.ndarray, np.ndarray]:
+        artifact = self.artifact
+        query_embedding = self.embeddings.embed_query(query)
+        top, scores = artifact.search_with_scores(query_embedding, fetch_k, search_filter)
+        return query_embedding, [artifact.documents[i] for i in top], scores, np.asarray(artifact.embeddings[top])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and promote vector store index artifacts")
+    parser.add_argument("--root", default=os.environ.get("INDEX_ARTIFACT_DIRECTORY", "./index_artifacts"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="export a Chroma collection to a new artifact")
+    export_parser.add_argument("--persist-directory", default=os.environ.get("CHROMADB_PERSIST_DIRECTORY", "./chroma_langchain_db"))
+    export_parser.add_argument("--collection", default="js_code_collection")
+    export_parser.add_argument("--agent-mode", default=os.environ.get("AGENT_MODE", "text"), choices=["text", "js_code"])
+    export_parser.add_argument("--embeddings-model", default="text-embedding-005")
+    export_parser.add_argument("--version")
+    export_parser.add_argument("--promote", action="store_true", help="promote the artifact once built")
+
+    promote_parser = subparsers.add_parser("promote", help="point CURRENT to a version")
+    promote_parser.add_argument("version")
+
+    subparsers.add_parser("list", help="list versions")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        # Imported here so that promoting and listing do not load the processors
+        from src.document_processors.javacript_code_processor import JSCodeDocumentProcessor
+        from src.document_processors.pdf_processor import PDFProcessor
+
+        processor_config = PDFProcessor.config if args.agent_mode == "text" else JSCodeDocumentProcessor.config
+        store = ChromaDB(
+            embeddings=None,
+            persist_directory=args.persist_directory,
+            collection_name=args.collection,
+        )
+        version = export_artifact(
+            store.export(),
+            args.root,
+            index_config(args.embeddings_model, processor_config),
+            args.version,
+        )
+        print(f"Built index artifact '{version}'")
+        if args.promote:
+            promote(args.root, version)
+            print(f"Promoted '{version}'")
+    elif args.command == "promote":
+        promote(args.root, args.version)
+        print(f"Promoted '{args.version}'")
+    elif args.command == "list":
+        current = current_version(args.root)
+        for version in list_versions(args.root):
+            manifest = read_manifest(args.root, version)
+            marker = "*" if version == current else " "
+            print(f"{marker} {version}  {manifest['count']} documents  config {manifest['config_hash'][:8]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Adaptive retrieval depth and maximal-marginal-relevance diversification.
+
+A search fetches a candidate pool with similarity scores and, where the store
+provides them, the stored vectors. The number of chunks kept is chosen from
+the score distribution, then MMR reorders the kept chunks and drops the ones
+redundant with already selected ones. MMR never reaches past the chosen depth, so
+dropping duplicates shrinks the result rather than pulling in rejected chunks.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from langchain_core.documents import Document
+from typing_extensions import List
+
+from src.vector_store.filters import SearchFilter
+
+
+def adaptive_k(scores: np.ndarray,
+               min_k: int,
+               max_k: int,
+               score_window: float = 0.15,
+               elbow_factor: float = 2.0) -> int:
+    """
+    Chooses how many of the candidates to keep from their similarity scores.
+    Candidates scoring more than `score_window` below the best one are dropped,
+    then the list is cut at the elbow: the largest gap between consecutive
+    scores, if it is at least `elbow_factor` times the mean gap.
+    Args:
+        scores (np.ndarray): Similarity scores in descending order.
+        min_k (int): Minimum number of candidates to keep.
+        max_k (int): Maximum number of candidates to keep.
+    Returns:
+        int: Number of candidates to keep.
+    """
+
+    if min_k > max_k:
+        raise ValueError(f"min_k ({min_k}) must not exceed max_k ({max_k})")
+
+    n = min(len(scores), max_k)
+    if n <= min_k:
+        return n
+
+    scores = np.asarray(scores[:n], dtype=np.float32)
+    k = max(min_k, int(np.count_nonzero(scores >= scores[0] - score_window)))
+
+    # gaps[i] is the drop between candidate i and i + 1
+    gaps = scores[:k - 1] - scores[1:k]
+    candidate_gaps = gaps[min_k - 1:]
+    if len(candidate_gaps) and gaps.mean() > 0:
+        elbow = int(np.argmax(candidate_gaps))
+        if candidate_gaps[elbow] >= elbow_factor * gaps.mean():
+            k = min_k + elbow
+
+    return k
+
+
+def mmr(query_embedding: np.ndarray,
+        embeddings: np.ndarray,
+        k: int,
+        lambda_mult: float = 0.7,
+        duplicate_threshold: float = 0.95) -> List[int]:
+    """
+    Selects up to `k` rows of `embeddings` by maximal marginal relevance.
+    Candidates nearly identical to a selected one are never selected, so fewer
+    than `k` rows are returned when the candidates are redundant.
+    Args:
+        query_embedding (np.ndarray): Query vector.
+        embeddings (np.ndarray): Candidate vectors, one row per candidate.
+        k (int): Maximum number of candidates to select.
+        lambda_mult (float): Trade-off between relevance (1) and diversity (0).
+        duplicate_threshold (float): Cosine similarity from which candidates are duplicates.
+    Returns:
+        List[int]: Indices of the selected candidates in selection order.
+    """
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    k = min(k, len(embeddings))
+    if k == 0:
+        return []
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.where(norms == 0, 1, norms)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1)
+
+    relevance = embeddings @ query
+    similarity = embeddings @ embeddings.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to the selected ones
+    redundancy = similarity[selected[0]].copy()
+    available = redundancy < duplicate_threshold
+    available[selected[0]] = False
+
+    while len(selected) < k and available.any():
+        marginal = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+        available &= redundancy < duplicate_threshold
+        available[best] = False
+
+    return selected
+
+
+def retrieve(vector_store,
+             query: str,
+             min_k: int,
+             max_k: int,
+             search_filter: Optional[SearchFilter] = None,
+             lambda_mult: float = 0.7) -> List[Document]:
+    """
+    Retrieves up to `max_k` diverse documents related to the query. Fewer than
+    `min_k` are only returned when the store has fewer or they are duplicates.
+    The vector store must provide `search_with_vectors`.
+    """
+
+    if min_k > max_k:
+        raise ValueError(f"min_k ({min_k}) must not exceed max_k ({max_k})")
+
+    query_embedding, docs, scores, embeddings = vector_store.search_with_vectors(
+        query, fetch_k=max_k, search_filter=search_filter,
+    )
+    if not docs:
+        return []
+
+    k = adaptive_k(scores, min_k, max_k)
+
+    # Stores which do not return the stored vectors are not diversified
+    if embeddings is None:
+        return docs[:k]
+
+    # Candidates past k were rejected by the score window or the elbow
+    return [docs[i] for i in mmr(query_embedding, embeddings[:k], k, lambda_mult)]
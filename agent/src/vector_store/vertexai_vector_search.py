@@ -1,3 +1,6 @@
+from typing import Optional, Tuple
+
+import numpy as np
 from typing_extensions import List
 
 from langchain_core.documents import Document
@@ -6,6 +9,13 @@ from langchain_google_vertexai import VectorSearchVectorStore
 
 from google.cloud import aiplatform
 
+from src.vector_store.filters import SearchFilter
+
+
+# Candidates fetched per requested result when filtering on path prefix,
+# which Vector Search restricts cannot express
+PATH_PREFIX_OVERSAMPLING = 4
+
 
 class VertexAIVectorStore:
     """
@@ -26,6 +36,7 @@ class VertexAIVectorStore:
         index_endpoint_id: str,
         embeddings: Embeddings,
     ):
+        self.embeddings = embeddings
         aiplatform.init(project=project_id, location=region, staging_bucket=bucket_uri)
 
         index = aiplatform.MatchingEngineIndex(index_id)
@@ -45,5 +56,43 @@ class VertexAIVectorStore:
         doc_ids = self.vector_store.add_documents(documents=documents)
         return len(doc_ids)
 
-    def search(self, query: str, k: int) -> List[Document]:
-        return self.vector_store.similarity_search(query=query, k=k)
+    def search(self, query: str, k: int, search_filter: Optional[SearchFilter] = None) -> List[Document]:
+        if search_filter is None or search_filter.is_empty():
+            return self.vector_store.similarity_search(query=query, k=k)
+
+        # String metadata values are indexed as restricts when documents are added,
+        # so namespaces, extensions and symbol kinds are filtered by the index
+        fetch_k = k * PATH_PREFIX_OVERSAMPLING if search_filter.path_prefix else k
+        docs = self.vector_store.similarity_search(
+            query=query,
+            k=fetch_k,
+            filter=search_filter.vertex_restricts(),
+        )
+        return [doc for doc in docs if search_filter.matches(doc.metadata)][:k]
+
+    def search_with_vectors(self,
+                            query: str,
+                            fetch_k: int,
+                            search_filter: Optional[SearchFilter] = None,
+                            ) -> Tuple[List[float], List[Document], np.ndarray, None]:
+        """
+        Returns the query embedding and up to `fetch_k` documents with their scores
+        in descending order. The index uses dot product distance, so higher scores
+        are more similar. Vector Search does not return the stored vectors here.
+        """
+
+        search_filter = search_filter or SearchFilter()
+        query_embedding = self.embeddings.embed_query(query)
+        fetch = fetch_k * PATH_PREFIX_OVERSAMPLING if search_filter.path_prefix else fetch_k
+
+        results = self.vector_store.similarity_search_by_vector_with_score(
+            embedding=query_embedding,
+            k=fetch,
+            filter=search_filter.vertex_restricts() or None,
+        )
+        results = [(doc, score) for doc, score in results if search_filter.matches(doc.metadata)]
+        results.sort(key=lambda result: -result[1])
+        results = results[:fetch_k]
+
+        scores = np.asarray([score for _, score in results], dtype=np.float32)
+        return query_embedding, [doc for doc, _ in results], scores, None
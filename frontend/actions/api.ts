@@ -20,13 +20,13 @@ export async function processFile(file: File) {
   return response.json();
 }
 
-export async function askAssistant(query: string) {
+export async function askAssistant(query: string, threadId?: string | null) {
   const response = await fetch(`${BACKEND_URL}/ask`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ query }),
+    body: JSON.stringify(threadId ? { query, thread_id: threadId } : { query }),
   });
 
   if (!response.ok) {
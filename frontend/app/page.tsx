@@ -12,6 +12,7 @@ export default function Home() {
   const [input, setInput] = useState('');
   const [isUploading, setIsUploading] = useState(false);
   const [isTyping, setIsTyping] = useState(false); // New state for typing indicator
+  const [threadId, setThreadId] = useState<string | null>(null); // Conversation continued by follow-up questions
 
   const handleFileUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
@@ -45,7 +46,10 @@ export default function Home() {
     setIsTyping(true); // Show typing indicator
 
     try {
-      const reply = await askAssistant(input);
+      const reply = await askAssistant(input, threadId);
+      if (reply.thread_id) {
+        setThreadId(reply.thread_id);
+      }
 
       setMessages(prev => [
         ...prev,
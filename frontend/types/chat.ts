@@ -15,4 +15,6 @@ export interface AssistantResponse {
   question: string;
   answer: string;
   source_documents: string[];
+  // Conversation of the answer, set when the backend keeps conversations
+  thread_id?: string | null;
 }